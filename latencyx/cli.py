@@ -237,6 +237,137 @@ Examples:
         help='Print existing traces and exit (like cat, not tail -f)'
     )
     
+    # Critical-path subcommand
+    cp_parser = subparsers.add_parser(
+        'critical-path',
+        help='Self-time and critical-path breakdown per route',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Breakdown per route plus waterfalls for the 5 slowest requests
+  latencyx critical-path
+  
+  # Top 10 contributors per route, 3 waterfalls
+  latencyx critical-path --top 10 --slowest 3
+  
+  # Machine-readable output
+  latencyx critical-path --format json
+        """
+    )
+    
+    cp_parser.add_argument(
+        '--file', '-f',
+        default='latencyx_traces.jsonl',
+        help='Path to traces file (default: latencyx_traces.jsonl)'
+    )
+    
+    cp_parser.add_argument(
+        '--top',
+        type=int,
+        default=5,
+        help='Contributing spans to show per route (default: 5)'
+    )
+    
+    cp_parser.add_argument(
+        '--slowest',
+        type=int,
+        default=5,
+        help='Render waterfalls for the N slowest requests (default: 5)'
+    )
+    
+    cp_parser.add_argument(
+        '--width',
+        type=int,
+        default=50,
+        help='Waterfall width in characters (default: 50)'
+    )
+    
+    cp_parser.add_argument(
+        '--max-pending',
+        type=int,
+        default=10000,
+        help='Max incomplete traces buffered while streaming (default: 10000)'
+    )
+    
+    cp_parser.add_argument(
+        '--format',
+        choices=['table', 'json'],
+        default='table',
+        help='Output format (default: table)'
+    )
+    
+    # Diff subcommand
+    diff_parser = subparsers.add_parser(
+        'diff',
+        help='Compare latency between two trace captures',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Compare a candidate build against a baseline
+  latencyx diff baseline.jsonl candidate.jsonl
+  
+  # Gate on p99 growing more than 5%
+  latencyx diff baseline.jsonl candidate.jsonl --metric p99 --threshold 0.05
+  
+  # Machine-readable output (gzipped captures work too)
+  latencyx diff baseline.jsonl.gz candidate.jsonl.gz --format json
+
+Exit codes: 0 = no regression, 1 = regression, 2 = file not found
+        """
+    )
+    
+    diff_parser.add_argument('baseline', help='Baseline traces file (.jsonl or .jsonl.gz)')
+    diff_parser.add_argument('candidate', help='Candidate traces file (.jsonl or .jsonl.gz)')
+    
+    diff_parser.add_argument(
+        '--metric',
+        choices=['p50', 'p95', 'p99'],
+        default='p95',
+        help='Quantile that must grow for a latency regression (default: p95)'
+    )
+    
+    diff_parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='Minimum relative increase of --metric, 0.1 = 10%% (default: 0.1)'
+    )
+    
+    diff_parser.add_argument(
+        '--error-threshold',
+        type=float,
+        default=0.01,
+        help='Minimum error-rate increase, 0.01 = 1 point (default: 0.01)'
+    )
+    
+    diff_parser.add_argument(
+        '--alpha',
+        type=float,
+        default=0.01,
+        help='Significance level for the Mann-Whitney / error-rate tests (default: 0.01)'
+    )
+    
+    diff_parser.add_argument(
+        '--min-count',
+        type=int,
+        default=30,
+        help='Minimum spans on each side before testing a span name (default: 30)'
+    )
+    
+    diff_parser.add_argument(
+        '--sample-size',
+        type=int,
+        default=1000,
+        help='Reservoir sample per span name used for the test (default: 1000)'
+    )
+    
+    diff_parser.add_argument(
+        '--format',
+        choices=['table', 'json'],
+        default='table',
+        help='Output format (default: table)'
+    )
+    
     args = parser.parse_args()
     
     # Handle commands
@@ -247,6 +378,31 @@ Examples:
             format=args.format
         )
         tailer.run()
+    elif args.command == 'critical-path':
+        from .critical_path import CriticalPathAnalyzer
+        analyzer = CriticalPathAnalyzer(
+            file_path=args.file,
+            top=args.top,
+            slowest=args.slowest,
+            width=args.width,
+            max_pending=args.max_pending,
+            output=args.format
+        )
+        analyzer.run()
+    elif args.command == 'diff':
+        from .diff import TraceDiff
+        differ = TraceDiff(
+            baseline=args.baseline,
+            candidate=args.candidate,
+            metric=args.metric,
+            threshold=args.threshold,
+            error_threshold=args.error_threshold,
+            alpha=args.alpha,
+            min_count=args.min_count,
+            sample_size=args.sample_size,
+            output=args.format
+        )
+        sys.exit(differ.run())
     else:
         parser.print_help()
 
@@ -26,13 +26,15 @@ class LatencyXConfig:
     # Instrumentation flags
     instrument_fastapi: bool = True
     instrument_http_client: bool = True
-    # instrument_psycopg2: bool = True  # Archived for v1
+    instrument_sqlite3: bool = False
+    instrument_psycopg2: bool = False
     # instrument_redis: bool = False  # Optional, can add later
     
     # Advanced options
     sample_rate: float = 1.0  # 1.0 = 100% sampling
     min_duration_ms: float = 0.0  # Only log spans above this duration
     include_traceback: bool = False  # Include stack traces for slow requests
+    n_plus_one_threshold: int = 5  # Same query this many times in one request = N+1
 
 # Global config instance
 config = LatencyXConfig()
\ No newline at end of file
@@ -1,26 +1,52 @@
 
 from contextlib import contextmanager
+from contextvars import ContextVar
 import time
-import threading
 from typing import Optional, Dict, Any
 from .config import config
 import traceback
 import random
 
-# Thread-local storage for current span
-_local = threading.local()
+# Current span for this thread / asyncio task. A ContextVar (rather than
+# threading.local) keeps concurrent requests on one event loop from
+# becoming each other's parents.
+_current_span = ContextVar("latencyx_current_span", default=None)
+
+# Marker stored in _current_span while inside a trace that was sampled out,
+# so nested spans follow the root's sampling decision
+_NOT_SAMPLED = object()
+
+
+def _new_id(bits: int) -> str:
+    """Random hex identifier (64-bit span IDs, 128-bit trace IDs)"""
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
 
 class Span:
-    def __init__(self, name: str, span_type: str = "generic", metadata: Optional[Dict[str, Any]] = None):
+    def __init__(self, name: str, span_type: str = "generic", metadata: Optional[Dict[str, Any]] = None,
+                 parent: Optional["Span"] = None):
         self.name = name
         self.span_type = span_type  # e.g., "http", "db", "cache"
         self.metadata = metadata or {}
         self.start = time.perf_counter()
+        
+        # Trace identity - children inherit the trace of their parent
+        self.parent = parent
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else _new_id(128)
+        self.trace_start = parent.trace_start if parent else self.start
+        
         self.end: Optional[float] = None
         self.duration_ms: Optional[float] = None
         self.error: Optional[str] = None
         self.traceback: Optional[str] = None
     
+    @property
+    def start_offset_ms(self) -> float:
+        """Start time relative to the root span of the trace"""
+        return (self.start - self.trace_start) * 1000
+    
     def finish(self, error: Optional[Exception] = None):
         if not config.enabled:
             return
@@ -45,18 +71,24 @@ class Span:
 @contextmanager
 def timed(name: str, span_type: str = "generic", metadata: Optional[Dict[str, Any]] = None):
     """Context manager for timing operations"""
-    # Check if we should sample this span
-    if not config.enabled or random.random() >= config.sample_rate:
-        # Not sampled - yield a no-op object
+    parent = _current_span.get()
+    if not config.enabled or parent is _NOT_SAMPLED:
+        # Disabled, or inside a trace that wasn't sampled - yield a no-op object
         yield None
         return
-
-    span = Span(name, span_type, metadata)
     
-    # Store parent span if exists
-    parent = getattr(_local, "current_span", None)
-    span.parent = parent
-    _local.current_span = span
+    # Sampling is decided once per trace, at the root span
+    if parent is None and random.random() >= config.sample_rate:
+        token = _current_span.set(_NOT_SAMPLED)
+        try:
+            yield None
+        finally:
+            _current_span.reset(token)
+        return
+
+    # Link to the enclosing span if there is one
+    span = Span(name, span_type, metadata, parent=parent)
+    token = _current_span.set(span)
     
     try:
         yield span
@@ -66,7 +98,7 @@ def timed(name: str, span_type: str = "generic", metadata: Optional[Dict[str, An
     finally:
         if span.end is None:  # If no error occurred
             span.finish()
-        _local.current_span = parent
+        _current_span.reset(token)
 
 
 def init(app=None, **kwargs):
@@ -130,13 +162,18 @@ def init(app=None, **kwargs):
         except (ImportError, AttributeError):
             pass  # httpx not installed or not available
     
-    # Auto-instrument psycopg2 - Archived for v1
-    # if config.instrument_psycopg2:
-    #     try:
-    #         from .instrumentors.psycopg2 import instrument_psycopg2
-    #         instrument_psycopg2()
-    #     except ImportError:
-    #         pass  # psycopg2 not installed
+    # Auto-instrument DB-API drivers
+    from .instrumentors.dbapi import instrument_dbapi
+    if config.instrument_sqlite3:
+        import sqlite3
+        instrument_dbapi(sqlite3, db_system="sqlite")
+    
+    if config.instrument_psycopg2:
+        try:
+            import psycopg2
+            instrument_dbapi(psycopg2, db_system="postgresql")
+        except ImportError:
+            pass  # psycopg2 not installed
     
     exporter_names = [e.value if hasattr(e, 'value') else str(e) for e in config.exporters]
     # print(f"LatencyX initialized with exporters: {exporter_names}")
\ No newline at end of file
@@ -0,0 +1,325 @@
+import heapq
+import json
+from collections import OrderedDict, defaultdict, Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+from .traces import iter_records, format_duration
+
+# Tolerance for the 3-decimal rounding applied by the JSON exporter
+_EPSILON_MS = 0.005
+
+# Cap on distinct critical-path shapes remembered per route
+_MAX_PATH_SHAPES = 100
+
+
+class SpanNode:
+    """A span record placed in its trace tree"""
+
+    __slots__ = ("name", "span_type", "span_id", "parent_id", "start", "duration", "error", "children")
+
+    def __init__(self, record: Dict[str, Any]):
+        self.name = record.get('span_name', 'unknown')
+        self.span_type = record.get('span_type', 'unknown')
+        self.span_id = record.get('span_id')
+        self.parent_id = record.get('parent_id')
+        self.start = float(record.get('start_offset_ms') or 0.0)
+        self.duration = float(record.get('duration_ms') or 0.0)
+        self.error = record.get('error')
+        self.children: List["SpanNode"] = []
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def walk(self, depth: int = 0):
+        """Yield (node, depth) in start order"""
+        yield self, depth
+        for child in sorted(self.children, key=lambda c: c.start):
+            yield from child.walk(depth + 1)
+
+
+def self_time(node: SpanNode) -> float:
+    """Time spent in the span itself, not covered by any child"""
+    intervals = sorted(
+        (max(c.start, node.start), min(c.end, node.end)) for c in node.children
+    )
+    covered = 0.0
+    cur_start = cur_end = None
+    for start, end in intervals:
+        if end <= start:
+            continue
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                covered += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        covered += cur_end - cur_start
+    return max(node.duration - covered, 0.0)
+
+
+def critical_path(node: SpanNode) -> List[Tuple[SpanNode, float]]:
+    """
+    Critical path through a trace tree.
+
+    Walks backwards from the end of each span, repeatedly picking the child
+    that finished last before the current point. Returns (span, ms) pairs
+    where ms is the time that span contributes to the path on its own.
+    """
+    path: List[Tuple[SpanNode, float]] = []
+    _critical_path(node, path)
+    return path
+
+
+def _critical_path(node: SpanNode, path: List[Tuple[SpanNode, float]]):
+    cursor = node.end + _EPSILON_MS
+    chosen = []
+    for child in sorted(node.children, key=lambda c: c.end, reverse=True):
+        if child.end <= cursor:
+            chosen.append(child)
+            cursor = child.start + _EPSILON_MS
+
+    covered = sum(
+        max(min(c.end, node.end) - max(c.start, node.start), 0.0) for c in chosen
+    )
+    path.append((node, max(node.duration - covered, 0.0)))
+    for child in reversed(chosen):
+        _critical_path(child, path)
+
+
+def _path_shape(path: List[Tuple[SpanNode, float]]) -> str:
+    """Compact signature of a critical path, collapsing repeated spans"""
+    parts = []
+    for node, _ in path:
+        if parts and parts[-1][0] == node.name:
+            parts[-1][1] += 1
+        else:
+            parts.append([node.name, 1])
+    return " → ".join(name if n == 1 else f"{name} ×{n}" for name, n in parts)
+
+
+class TraceAssembler:
+    """
+    Rebuild trace trees from a stream of span records.
+
+    Spans are exported when they finish, so children are written before
+    their parent and a trace is complete once its root arrives. Pending
+    children are buffered per trace; the oldest traces are dropped once
+    more than max_pending are waiting, which keeps memory bounded when
+    roots never show up (e.g. filtered by min_duration_ms).
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, List[SpanNode]]" = OrderedDict()
+        self.untraced = 0  # Records without trace IDs (older exporter versions)
+        self.dropped = 0  # Spans whose root never arrived
+
+    def add(self, record: Dict[str, Any]) -> Optional[SpanNode]:
+        """Add a record; returns the root node when a trace completes"""
+        trace_id = record.get('trace_id')
+        if not trace_id or not record.get('span_id'):
+            self.untraced += 1
+            return None
+
+        node = SpanNode(record)
+        if node.parent_id is None:
+            return self._build(node, self._pending.pop(trace_id, []))
+
+        spans = self._pending.get(trace_id)
+        if spans is None:
+            spans = self._pending[trace_id] = []
+            if len(self._pending) > self.max_pending:
+                _, evicted = self._pending.popitem(last=False)
+                self.dropped += len(evicted)
+        spans.append(node)
+        return None
+
+    def close(self):
+        """Account for traces still waiting for their root"""
+        for spans in self._pending.values():
+            self.dropped += len(spans)
+        self._pending.clear()
+
+    @staticmethod
+    def _build(root: SpanNode, spans: List[SpanNode]) -> SpanNode:
+        by_id = {root.span_id: root}
+        for span in spans:
+            by_id[span.span_id] = span
+        for span in spans:
+            # Spans whose parent was filtered out hang off the root
+            parent = by_id.get(span.parent_id, root)
+            parent.children.append(span)
+        return root
+
+
+class _RouteStats:
+    """Per-route accumulator"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.self_ms: Dict[str, float] = defaultdict(float)
+        self.critical_ms: Dict[str, float] = defaultdict(float)
+        self.shapes: Counter = Counter()
+
+
+class CriticalPathAnalyzer:
+    """Self-time and critical-path breakdown per route from a trace file"""
+
+    def __init__(self, file_path="latencyx_traces.jsonl", top=5, slowest=5, width=50,
+                 max_pending=10000, output="table"):
+        self.file_path = Path(file_path)
+        self.top = top
+        self.slowest = slowest
+        self.width = width
+        self.output = output
+        self.assembler = TraceAssembler(max_pending=max_pending)
+        self.routes: Dict[str, _RouteStats] = defaultdict(_RouteStats)
+        self._slowest: List[Tuple[float, int, SpanNode]] = []
+        self._seq = 0
+
+    def run(self):
+        """Analyze the file and print the report"""
+        if not self.file_path.exists():
+            print(f"❌ File not found: {self.file_path}")
+            print(f"   Make sure 'json_file' exporter is enabled in your LatencyX config")
+            return
+
+        for record in iter_records(self.file_path):
+            root = self.assembler.add(record)
+            if root is not None:
+                self.add_trace(root)
+        self.assembler.close()
+
+        if self.output == "json":
+            print(json.dumps(self.summary(), indent=2))
+        else:
+            self._print_report()
+
+    def add_trace(self, root: SpanNode):
+        """Fold one complete trace into the per-route stats"""
+        stats = self.routes[root.name]
+        stats.count += 1
+        stats.total_ms += root.duration
+
+        for node, depth in root.walk():
+            name = "(self)" if depth == 0 else node.name
+            stats.self_ms[name] += self_time(node)
+
+        path = critical_path(root)
+        for node, ms in path:
+            name = "(self)" if node is root else node.name
+            stats.critical_ms[name] += ms
+
+        shape = _path_shape(path)
+        if shape in stats.shapes or len(stats.shapes) < _MAX_PATH_SHAPES:
+            stats.shapes[shape] += 1
+
+        # Keep only the N slowest trees in memory
+        if self.slowest > 0:
+            self._seq += 1
+            item = (root.duration, self._seq, root)
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, item)
+            elif item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def summary(self) -> Dict[str, Any]:
+        """Report as a JSON-serializable dict"""
+        routes = {}
+        for route, stats in sorted(self.routes.items(), key=lambda kv: -kv[1].total_ms):
+            contributors = [
+                {
+                    "span_name": name,
+                    "avg_critical_ms": round(ms / stats.count, 3),
+                    "avg_self_ms": round(stats.self_ms.get(name, 0.0) / stats.count, 3),
+                    "share": round(ms / stats.total_ms, 4) if stats.total_ms else 0.0,
+                }
+                for name, ms in sorted(stats.critical_ms.items(), key=lambda kv: -kv[1])[:self.top]
+            ]
+            shape, shape_count = stats.shapes.most_common(1)[0] if stats.shapes else ("", 0)
+            routes[route] = {
+                "requests": stats.count,
+                "avg_ms": round(stats.total_ms / stats.count, 3),
+                "avg_self_ms": round(stats.self_ms["(self)"] / stats.count, 3),
+                "top_contributors": contributors,
+                "common_critical_path": shape,
+                "common_critical_path_count": shape_count,
+            }
+        return {
+            "file": str(self.file_path),
+            "routes": routes,
+            "slowest": [
+                {
+                    "span_name": root.name,
+                    "duration_ms": root.duration,
+                    "critical_path": [
+                        {"span_name": node.name, "ms": round(ms, 3)} for node, ms in critical_path(root)
+                    ],
+                }
+                for _, _, root in sorted(self._slowest, reverse=True)
+            ],
+            "untraced_spans": self.assembler.untraced,
+            "dropped_spans": self.assembler.dropped,
+        }
+
+    def _print_report(self):
+        header_line = "─" * 100
+        if not self.routes:
+            print("No complete traces found.")
+
+        for route, data in self.summary()["routes"].items():
+            print(header_line)
+            print(
+                f"{route}  requests={data['requests']}  "
+                f"avg={format_duration(data['avg_ms'])}  "
+                f"self={format_duration(data['avg_self_ms'])}"
+            )
+            print(header_line)
+            print(f"  {'SPAN':<40} │ {'CRIT/REQ':>10} │ {'SELF/REQ':>10} │ {'SHARE':>6}")
+            for c in data["top_contributors"]:
+                name = c["span_name"]
+                if len(name) > 40:
+                    name = name[:39] + "…"
+                print(
+                    f"  {name:<40} │ "
+                    f"{format_duration(c['avg_critical_ms']):>10} │ "
+                    f"{format_duration(c['avg_self_ms']):>10} │ "
+                    f"{c['share'] * 100:>5.1f}%"
+                )
+            if data["common_critical_path"]:
+                print(
+                    f"  critical path ({data['common_critical_path_count']}/{data['requests']}): "
+                    f"{data['common_critical_path']}"
+                )
+            print()
+
+        for _, _, root in sorted(self._slowest, reverse=True):
+            self._print_waterfall(root)
+
+        if self.assembler.untraced:
+            print(f"⚠️  Skipped {self.assembler.untraced} spans without trace IDs")
+        if self.assembler.dropped:
+            print(f"⚠️  Dropped {self.assembler.dropped} spans whose root span was never recorded")
+
+    def _print_waterfall(self, root: SpanNode):
+        """ASCII waterfall: █ marks spans on the critical path"""
+        on_path = {id(node) for node, _ in critical_path(root)}
+        total = root.duration or 1.0
+        scale = self.width / total
+
+        print(f"▸ {root.name}  {format_duration(root.duration)}")
+        for node, depth in root.walk():
+            label = "  " * depth + node.name
+            if len(label) > 40:
+                label = label[:39] + "…"
+            offset = min(int((node.start - root.start) * scale), self.width - 1)
+            length = max(1, min(int(round(node.duration * scale)), self.width - offset))
+            char = "█" if id(node) in on_path else "░"
+            bar = " " * offset + char * length
+            marker = " !" if node.error else ""
+            print(f"  {label:<40} │{bar:<{self.width}}│ {format_duration(node.duration):>9}{marker}")
+        print()
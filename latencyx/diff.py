@@ -0,0 +1,402 @@
+import json
+import math
+import random
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Set, Any
+
+from .traces import iter_records, format_duration
+
+# Span names tracked before the rest are lumped into "(other)". Together with
+# the bucket cap and the sample size this bounds memory per file at roughly
+# _MAX_NAMES * (_MAX_BUCKETS * ~100 B + sample_size * 8 B), about 60 MB
+# worst case with the defaults.
+_MAX_NAMES = 1000
+_MAX_BUCKETS = 512
+_OTHER = "(other)"
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with bounded relative error.
+
+    Values are counted in buckets whose bounds grow geometrically, so any
+    quantile is within `relative_accuracy` of the true value and memory
+    depends only on the range of values seen, not on how many there are.
+    Past max_buckets the lowest buckets are merged, which only costs
+    accuracy at the fast end of the distribution.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3,
+                 max_buckets: int = _MAX_BUCKETS):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0  # Values at or below min_value
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        if key in self.buckets:
+            self.buckets[key] += 1
+            return
+        self.buckets[key] = 1
+        if len(self.buckets) > self.max_buckets:
+            lowest = min(self.buckets)
+            count = self.buckets.pop(lowest)
+            second = min(self.buckets)
+            self.buckets[second] += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket, clamped to the observed range
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class Reservoir:
+    """Fixed-size uniform random sample of a stream (Algorithm R)"""
+
+    def __init__(self, size: int, rng: random.Random):
+        self.size = size
+        self.rng = rng
+        self.samples = array('d')
+        self.seen = 0
+
+    def add(self, value: float):
+        self.seen += 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            i = self.rng.randrange(self.seen)
+            if i < self.size:
+                self.samples[i] = value
+
+
+class SpanDistribution:
+    """Latency sketch, error count and test sample for one span name"""
+
+    def __init__(self, sample_size: int, rng: random.Random):
+        self.sketch = QuantileSketch()
+        self.sample = Reservoir(sample_size, rng)
+        self.errors = 0
+
+    @property
+    def count(self) -> int:
+        return self.sketch.count
+
+    def add(self, duration_ms: float, error: bool):
+        self.sketch.add(duration_ms)
+        self.sample.add(duration_ms)
+        if error:
+            self.errors += 1
+
+
+class TraceProfile:
+    """
+    Per-span-name distributions for one trace file, built in one pass.
+
+    `names` is the set of span names tracked individually. Pass the same set
+    to the profiles being compared so a name is either tracked in both or
+    folded into "(other)" in both.
+    """
+
+    def __init__(self, file_path, sample_size: int = 1000, seed: int = 0,
+                 names: Optional[Set[str]] = None):
+        self.file_path = Path(file_path)
+        self.sample_size = sample_size
+        self.rng = random.Random(seed)
+        self.names = names if names is not None else set()
+        self.spans: Dict[str, SpanDistribution] = {}
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+
+    def load(self) -> "TraceProfile":
+        for record in iter_records(self.file_path):
+            self.add(record)
+        return self
+
+    def add(self, record: Dict[str, Any]):
+        duration_ms = record.get('duration_ms')
+        if not isinstance(duration_ms, (int, float)) or not math.isfinite(duration_ms):
+            return  # json.loads accepts NaN / Infinity
+
+        name = record.get('span_name', 'unknown')
+        if name not in self.names:
+            if len(self.names) < _MAX_NAMES:
+                self.names.add(name)
+            else:
+                name = _OTHER
+        dist = self.spans.get(name)
+        if dist is None:
+            dist = self.spans[name] = SpanDistribution(self.sample_size, self.rng)
+
+        status_code = record.get('status_code')
+        error = record.get('status') == 'error' or (isinstance(status_code, int) and status_code >= 500)
+        dist.add(float(duration_ms), error)
+
+        # ISO timestamps compare correctly as strings
+        timestamp = record.get('timestamp')
+        if isinstance(timestamp, str):
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+
+    @property
+    def duration_s(self) -> Optional[float]:
+        """Wall-clock span of the capture, from record timestamps"""
+        if not self.first_timestamp or not self.last_timestamp:
+            return None
+        try:
+            first = datetime.fromisoformat(self.first_timestamp)
+            last = datetime.fromisoformat(self.last_timestamp)
+        except ValueError:
+            return None
+        seconds = (last - first).total_seconds()
+        return seconds if seconds > 0 else None
+
+    def throughput(self, name: str) -> Optional[float]:
+        """Spans per second for a span name"""
+        duration_s = self.duration_s
+        if duration_s is None:
+            return None
+        return self.spans[name].count / duration_s
+
+
+def mann_whitney_u(baseline: Sequence[float], candidate: Sequence[float]) -> float:
+    """
+    One-sided Mann-Whitney U test, normal approximation with tie correction.
+
+    Returns the p-value for "candidate tends to be slower than baseline".
+    """
+    n1, n2 = len(baseline), len(candidate)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+
+    combined = sorted([(v, 0) for v in baseline] + [(v, 1) for v in candidate])
+    n = n1 + n2
+    rank_sum = 0.0  # Sum of candidate ranks
+    tie_term = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        avg_rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        rank_sum += avg_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 1)
+        i = j + 1
+
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _error_rate_p_value(errors1: int, n1: int, errors2: int, n2: int) -> float:
+    """One-sided two-proportion z-test for "candidate has more errors" """
+    pooled = (errors1 + errors2) / (n1 + n2)
+    variance = pooled * (1 - pooled) * (1 / n1 + 1 / n2)
+    if variance <= 0:
+        return 1.0
+    z = (errors2 / n2 - errors1 / n1) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def _relative_change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if old is None or new is None or old <= 0:
+        return None
+    return (new - old) / old
+
+
+class TraceDiff:
+    """Compare latency distributions between a baseline and a candidate capture"""
+
+    def __init__(self, baseline, candidate, metric="p95", threshold=0.1, error_threshold=0.01,
+                 alpha=0.01, min_count=30, sample_size=1000, output="table"):
+        self.baseline_path = Path(baseline)
+        self.candidate_path = Path(candidate)
+        self.metric = metric
+        self.threshold = threshold
+        self.error_threshold = error_threshold
+        self.alpha = alpha
+        self.min_count = min_count
+        self.sample_size = sample_size
+        self.output = output
+
+    def run(self) -> int:
+        """Run the comparison; returns the process exit code (1 on regression)"""
+        for path in (self.baseline_path, self.candidate_path):
+            if not path.exists():
+                print(f"❌ File not found: {path}")
+                return 2
+
+        # The baseline claims tracked names first; the candidate reuses them
+        names: Set[str] = set()
+        baseline = TraceProfile(self.baseline_path, self.sample_size, names=names).load()
+        candidate = TraceProfile(self.candidate_path, self.sample_size, names=names).load()
+        result = self.compare(baseline, candidate)
+
+        if self.output == "json":
+            print(json.dumps(result, indent=2))
+        else:
+            self._print_table(result)
+
+        return 1 if result["regressions"] else 0
+
+    def compare(self, baseline: TraceProfile, candidate: TraceProfile) -> Dict[str, Any]:
+        """Diff two loaded profiles into a JSON-serializable dict"""
+        spans = {}
+        regressions = []
+
+        for name in sorted(set(baseline.spans) | set(candidate.spans)):
+            base = baseline.spans.get(name)
+            cand = candidate.spans.get(name)
+            entry: Dict[str, Any] = {
+                "baseline_count": base.count if base else 0,
+                "candidate_count": cand.count if cand else 0,
+            }
+
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                old = base.sketch.quantile(q) if base else None
+                new = cand.sketch.quantile(q) if cand else None
+                entry[key] = {
+                    "baseline": _round(old),
+                    "candidate": _round(new),
+                    "change": _round(_relative_change(old, new), 4),
+                }
+
+            entry["throughput"] = {
+                "baseline": _round(baseline.throughput(name) if base else None),
+                "candidate": _round(candidate.throughput(name) if cand else None),
+            }
+            entry["error_rate"] = {
+                "baseline": _round(base.errors / base.count if base else None, 4),
+                "candidate": _round(cand.errors / cand.count if cand else None, 4),
+            }
+
+            # "(other)" mixes unrelated spans, so its changes aren't meaningful
+            entry["tested"] = (
+                name != _OTHER and base is not None and cand is not None
+                and base.count >= self.min_count and cand.count >= self.min_count
+            )
+            entry["p_value"] = None
+            entry["regression"] = []
+            if entry["tested"]:
+                p_value = mann_whitney_u(base.sample.samples, cand.sample.samples)
+                entry["p_value"] = _round(p_value, 6)
+
+                change = entry[self.metric]["change"]
+                if p_value < self.alpha and change is not None and change > self.threshold:
+                    entry["regression"].append("latency")
+
+                error_delta = cand.errors / cand.count - base.errors / base.count
+                error_p = _error_rate_p_value(base.errors, base.count, cand.errors, cand.count)
+                if error_delta > self.error_threshold and error_p < self.alpha:
+                    entry["regression"].append("errors")
+
+            if entry["regression"]:
+                regressions.append(name)
+            spans[name] = entry
+
+        return {
+            "baseline": str(self.baseline_path),
+            "candidate": str(self.candidate_path),
+            "metric": self.metric,
+            "threshold": self.threshold,
+            "alpha": self.alpha,
+            "spans": spans,
+            "regressions": regressions,
+        }
+
+    def _print_table(self, result: Dict[str, Any]):
+        header_line = "─" * 128
+        print(f"📊 Baseline:  {result['baseline']}")
+        print(f"   Candidate: {result['candidate']}\n")
+        print(header_line)
+        print(
+            f"{'NAME':<32} │ {'COUNT':>13} │ {'P50':>16} │ {'P95':>16} │ {'P99':>16} │ "
+            f"{'ERR Δ':>7} │ {'RPS Δ':>7} │ {'VERDICT':<10}"
+        )
+        print(header_line)
+
+        for name, entry in result["spans"].items():
+            if len(name) > 32:
+                name = name[:31] + "…"
+            count = f"{entry['baseline_count']}/{entry['candidate_count']}"
+            cells = [self._quantile_cell(entry[f"p{int(q * 100)}"]) for q in QUANTILES]
+
+            errors = entry["error_rate"]
+            if errors["baseline"] is not None and errors["candidate"] is not None:
+                error_str = f"{(errors['candidate'] - errors['baseline']) * 100:+.1f}pp"
+            else:
+                error_str = "-"
+
+            rps_change = _relative_change(entry["throughput"]["baseline"], entry["throughput"]["candidate"])
+            rps_str = f"{rps_change * 100:+.0f}%" if rps_change is not None else "-"
+
+            if entry["regression"]:
+                verdict = f"\033[91m{'REGRESSED':<10}\033[0m"
+            elif not entry["baseline_count"]:
+                verdict = "new"
+            elif not entry["candidate_count"]:
+                verdict = "gone"
+            elif name == _OTHER:
+                verdict = "not tested"
+            elif not entry["tested"]:
+                verdict = "too few"
+            else:
+                verdict = "ok"
+
+            print(
+                f"{name:<32} │ {count:>13} │ {cells[0]:>16} │ {cells[1]:>16} │ {cells[2]:>16} │ "
+                f"{error_str:>7} │ {rps_str:>7} │ {verdict:<10}"
+            )
+
+        print(header_line)
+        if result["regressions"]:
+            print(f"❌ {len(result['regressions'])} regression(s) at alpha={result['alpha']}")
+        else:
+            print("✅ No significant regressions")
+
+    @staticmethod
+    def _quantile_cell(values: Dict[str, Optional[float]]) -> str:
+        """Candidate value plus change vs baseline, e.g. '14.1ms +12%'"""
+        if values["candidate"] is None:
+            return "-"
+        cell = format_duration(values["candidate"])
+        if values["change"] is not None:
+            cell += f" {values['change'] * 100:+.0f}%"
+        return cell
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return round(value, digits) if value is not None else None
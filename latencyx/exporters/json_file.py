@@ -18,6 +18,10 @@ class JsonFileExporter:
             "span_type": span.span_type,
             "duration_ms": round(span.duration_ms, 3),
             "status": "error" if span.error else "success",
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "start_offset_ms": round(span.start_offset_ms, 3),
         }
         
         # Flatten important metadata to top level
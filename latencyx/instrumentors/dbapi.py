@@ -0,0 +1,477 @@
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Any, Optional
+
+from ..config import config
+from ..core import timed, _current_span, _NOT_SAMPLED
+
+# Store original connect functions, keyed by module name
+_original_connects: Dict[str, Any] = {}
+_instrumentation_lock = threading.Lock()
+
+# Traced driver subclasses, keyed by (base class, db_system)
+_traced_classes: Dict[Any, type] = {}
+
+# Per-fingerprint aggregate stats
+_query_stats: Dict[str, "QueryStats"] = {}
+_stats_lock = threading.Lock()
+
+# Query normalization patterns
+# One pass over literals and comments, so `--` inside a string isn't a comment
+_LITERAL_OR_COMMENT_RE = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+_PARAM_RE = re.compile(r"%s|%\(\w+\)s|\$\d+|(?<!:):\w+|\?")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_WHITESPACE_RE = re.compile(r"\s+")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS_RE = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a query so that executions differing only in literals match.
+
+    Comments, string/number literals and driver placeholders all become `?`,
+    and IN lists / multi-row VALUES collapse to a single `(?)`:
+
+        SELECT * FROM users WHERE id IN (1, 2, 3) -> SELECT * FROM users WHERE id IN (?)
+    """
+    sql = _LITERAL_OR_COMMENT_RE.sub(lambda m: "?" if m.group().startswith("'") else " ", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _WHITESPACE_RE.sub(" ", sql).strip().rstrip(";").rstrip()
+    sql = _LIST_RE.sub("(?)", sql)
+    return _ROWS_RE.sub("(?)", sql)
+
+
+class QueryStats:
+    """Aggregate timings for one query fingerprint"""
+
+    __slots__ = ("fingerprint", "count", "errors", "rows", "execute_ms", "fetch_ms", "max_ms")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.execute_ms = 0.0
+        self.fetch_ms = 0.0
+        self.max_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "execute_ms": round(self.execute_ms, 3),
+            "fetch_ms": round(self.fetch_ms, 3),
+            "avg_ms": round((self.execute_ms + self.fetch_ms) / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+def _record(query: str, execute_ms: float = 0.0, fetch_ms: float = 0.0, rows: int = 0,
+            executed: bool = False, error: bool = False):
+    with _stats_lock:
+        stats = _query_stats.get(query)
+        if stats is None:
+            stats = _query_stats[query] = QueryStats(query)
+        if executed:
+            stats.count += 1
+        if error:
+            stats.errors += 1
+        stats.rows += rows
+        stats.execute_ms += execute_ms
+        stats.fetch_ms += fetch_ms
+        stats.max_ms = max(stats.max_ms, execute_ms, fetch_ms)
+
+
+def get_query_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of per-fingerprint stats since startup (or the last reset)"""
+    with _stats_lock:
+        return {query: stats.to_dict() for query, stats in _query_stats.items()}
+
+
+def reset_query_stats():
+    """Clear all per-fingerprint stats"""
+    with _stats_lock:
+        _query_stats.clear()
+
+
+def _track_request(query: str) -> int:
+    """
+    Count executions of a fingerprint within the current request.
+
+    Counts live on the root span of the trace; once a fingerprint reaches
+    config.n_plus_one_threshold it is listed under the root's "n_plus_one"
+    metadata. Returns how many times the query ran in this request so far,
+    or 0 outside of any request.
+    """
+    root = _current_span.get()
+    if root is None or root is _NOT_SAMPLED:
+        return 0  # Not inside a (sampled) request
+    while root.parent is not None:
+        root = root.parent
+
+    counts = getattr(root, "db_query_counts", None)
+    if counts is None:
+        counts = root.db_query_counts = {}
+    count = counts[query] = counts.get(query, 0) + 1
+
+    root.metadata["db_queries"] = root.metadata.get("db_queries", 0) + 1
+    if count == config.n_plus_one_threshold:
+        root.metadata.setdefault("n_plus_one", []).append(query)
+    return count
+
+
+class _CursorTracing:
+    """Tracing shared by the cursor proxy and traced driver cursor subclasses"""
+
+    _db_system = "sql"
+    _query: Optional[str] = None
+
+    # Fetch time and rows for the current result set, flushed to the shared
+    # stats once (next execute, exhaustion or close) instead of per row
+    _fetch_ms = 0.0
+    _fetch_rows = 0
+
+    @property
+    def _raw_cursor(self):
+        """The driver's own cursor object"""
+        return self
+
+    def _query_text(self, sql) -> str:
+        """Fingerprint for any SQL object a driver accepts"""
+        if isinstance(sql, bytes):
+            sql = sql.decode("utf-8", errors="replace")
+        elif not isinstance(sql, str) and callable(getattr(sql, "as_string", None)):
+            # psycopg2.sql.Composable - render it, its repr embeds literal values
+            try:
+                sql = sql.as_string(self._raw_cursor)
+            except Exception:
+                pass
+        if isinstance(sql, str):
+            return fingerprint(sql)
+        return type(sql).__name__
+
+    def _traced_execute(self, method, sql, args, kwargs):
+        query = self._query_text(sql)
+        self._flush_fetch()
+        self._query = query
+
+        metadata = {"db_system": self._db_system, "query": query}
+        query_count = _track_request(query)
+        if query_count:
+            metadata["query_count"] = query_count
+
+        cursor = self._raw_cursor
+        start = time.perf_counter()
+        try:
+            with timed(query, span_type="db", metadata=metadata) as span:
+                result = method(sql, *args, **kwargs)
+                rowcount = getattr(cursor, "rowcount", -1)
+                if span and rowcount is not None and rowcount >= 0:
+                    span.metadata["rows"] = rowcount
+        except Exception:
+            _record(query, execute_ms=(time.perf_counter() - start) * 1000, executed=True, error=True)
+            raise
+
+        # Statements without a result set report affected rows here;
+        # rows of SELECTs are counted as they are fetched
+        rows = 0
+        if getattr(cursor, "description", None) is None:
+            rowcount = getattr(cursor, "rowcount", -1)
+            rows = rowcount if rowcount is not None and rowcount > 0 else 0
+        _record(query, execute_ms=(time.perf_counter() - start) * 1000, rows=rows, executed=True)
+        return result
+
+    def _traced_fetchone(self, method):
+        start = time.perf_counter()
+        row = method()
+        self._add_fetch(start, 0 if row is None else 1)
+        if row is None:
+            self._flush_fetch()
+        return row
+
+    def _traced_fetch(self, method, args, kwargs, exhausts: bool = False):
+        # fetchone() is only aggregated; bulk fetches also get their own span
+        # so time spent materializing results shows up in the trace tree
+        start = time.perf_counter()
+        name = f"fetch {self._query}" if self._query else "fetch"
+        metadata = {"db_system": self._db_system, "query": self._query}
+        with timed(name, span_type="db.fetch", metadata=metadata) as span:
+            rows = method(*args, **kwargs)
+            if span:
+                span.metadata["rows"] = len(rows)
+        self._add_fetch(start, len(rows))
+        if exhausts:
+            self._flush_fetch()
+        return rows
+
+    def _add_fetch(self, start: float, rows: int):
+        self._fetch_ms += (time.perf_counter() - start) * 1000
+        self._fetch_rows += rows
+
+    def _flush_fetch(self):
+        if self._query is not None and (self._fetch_rows or self._fetch_ms):
+            _record(self._query, fetch_ms=self._fetch_ms, rows=self._fetch_rows)
+        self._fetch_ms = 0.0
+        self._fetch_rows = 0
+
+
+class TracedCursor(_CursorTracing):
+    """DB-API 2.0 cursor proxy recording `db` spans"""
+
+    def __init__(self, cursor, db_system: str):
+        self._cursor = cursor
+        self._db_system = db_system
+        self._query = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # The proxy's own state is _-prefixed; everything else is the driver's
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __delattr__(self, name):
+        if name.startswith("_"):
+            object.__delattr__(self, name)
+        else:
+            delattr(self._cursor, name)
+
+    @property
+    def _raw_cursor(self):
+        return self._cursor
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._flush_fetch()
+        return self._cursor.close()
+
+    def execute(self, sql, *args, **kwargs):
+        result = self._traced_execute(self._cursor.execute, sql, args, kwargs)
+        # Drivers such as sqlite3 return the cursor itself for chaining
+        return self if result is self._cursor else result
+
+    def executemany(self, sql, *args, **kwargs):
+        result = self._traced_execute(self._cursor.executemany, sql, args, kwargs)
+        return self if result is self._cursor else result
+
+    def fetchone(self):
+        return self._traced_fetchone(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._traced_fetch(self._cursor.fetchmany, args, kwargs)
+
+    def fetchall(self):
+        return self._traced_fetch(self._cursor.fetchall, (), {}, exhausts=True)
+
+
+class TracedConnection:
+    """DB-API 2.0 connection proxy handing out traced cursors"""
+
+    def __init__(self, connection, db_system: str):
+        self._connection = connection
+        self._db_system = db_system
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        # e.g. conn.row_factory / conn.autocommit must reach the real connection
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._connection, name, value)
+
+    def __delattr__(self, name):
+        if name.startswith("_"):
+            object.__delattr__(self, name)
+        else:
+            delattr(self._connection, name)
+
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._connection.__exit__(*exc)
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._connection.cursor(*args, **kwargs), self._db_system)
+
+    def execute(self, sql, *args, **kwargs):
+        # sqlite3 shortcut: Connection.execute() creates a cursor implicitly
+        return self.cursor().execute(sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self.cursor().executemany(sql, *args, **kwargs)
+
+
+class _TracedCursorSubclass(_CursorTracing):
+    """Mixin turning a driver cursor class into a traced subclass"""
+
+    def execute(self, sql, *args, **kwargs):
+        return self._traced_execute(super().execute, sql, args, kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return self._traced_execute(super().executemany, sql, args, kwargs)
+
+    def fetchone(self):
+        return self._traced_fetchone(super().fetchone)
+
+    def __next__(self):
+        # Iteration stays native (psycopg2 named cursors fetch in batches)
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush_fetch()
+            raise
+        self._add_fetch(start, 1)
+        return row
+
+    def close(self):
+        self._flush_fetch()
+        return super().close()
+
+    def fetchmany(self, *args, **kwargs):
+        return self._traced_fetch(super().fetchmany, args, kwargs)
+
+    def fetchall(self):
+        return self._traced_fetch(super().fetchall, (), {}, exhausts=True)
+
+
+def _traced_cursor_class(base: type, db_system: str) -> type:
+    """Traced subclass of a driver cursor class (e.g. psycopg2 RealDictCursor)"""
+    if issubclass(base, _TracedCursorSubclass):
+        return base
+    key = (base, db_system)
+    with _instrumentation_lock:
+        cls = _traced_classes.get(key)
+        if cls is None:
+            cls = _traced_classes[key] = type(
+                f"LatencyX{base.__name__}", (_TracedCursorSubclass, base), {"_db_system": db_system}
+            )
+    return cls
+
+
+def _traced_connection_class(base: type, default_cursor: type, db_system: str,
+                             factory_arg: str = "cursor_factory", factory_pos: int = 1) -> type:
+    """
+    Traced subclass of a driver connection class.
+
+    Connections stay real driver objects, so type checks such as
+    psycopg2.extras.register_uuid(conn) or sqlite3's backup() keep working.
+    `factory_arg` / `factory_pos` name the cursor class argument of
+    base.cursor() (psycopg2: cursor(name, cursor_factory), sqlite3: cursor(factory)).
+    """
+    key = (base, db_system)
+    with _instrumentation_lock:
+        cls = _traced_classes.get(key)
+    if cls is not None:
+        return cls
+
+    def cursor(self, *args, **kwargs):
+        args = list(args)
+        if len(args) > factory_pos:
+            factory = args[factory_pos] or getattr(self, "cursor_factory", None) or default_cursor
+            args[factory_pos] = _traced_cursor_class(factory, db_system)
+        else:
+            factory = kwargs.get(factory_arg) or getattr(self, "cursor_factory", None) or default_cursor
+            kwargs[factory_arg] = _traced_cursor_class(factory, db_system)
+        return base.cursor(self, *args, **kwargs)
+
+    namespace = {"cursor": cursor}
+
+    # sqlite3's Connection.execute() runs the query in C without going
+    # through Cursor.execute, so route the shortcuts through cursor()
+    if hasattr(base, "execute"):
+        def execute(self, sql, *args, **kwargs):
+            return self.cursor().execute(sql, *args, **kwargs)
+
+        namespace["execute"] = execute
+    if hasattr(base, "executemany"):
+        def executemany(self, sql, *args, **kwargs):
+            return self.cursor().executemany(sql, *args, **kwargs)
+
+        namespace["executemany"] = executemany
+
+    with _instrumentation_lock:
+        return _traced_classes.setdefault(key, type(f"LatencyX{base.__name__}", (base,), namespace))
+
+
+def instrument_connection(connection, db_system: str = "sql"):
+    """
+    Wrap an existing DB-API connection so its cursors are traced.
+
+    The result is a proxy; prefer instrument_dbapi() for drivers whose
+    functions check the concrete connection type.
+    """
+    if isinstance(connection, TracedConnection):
+        return connection
+    return TracedConnection(connection, db_system)
+
+
+def instrument_dbapi(module, db_system: Optional[str] = None):
+    """
+    Instrument a DB-API 2.0 driver module (sqlite3, psycopg2, ...)
+
+    Patches module.connect so every new connection hands out traced cursors.
+    sqlite3 and psycopg2 connections are created from traced driver
+    subclasses via their connection factory argument; drivers without such
+    a hook get a connection proxy.
+    """
+    name = module.__name__
+    db_system = db_system or name
+
+    with _instrumentation_lock:
+        if name in _original_connects:
+            return  # Already instrumented
+        original_connect = _original_connects[name] = module.connect
+
+    extensions = getattr(module, "extensions", None)
+    if name == "psycopg2" and extensions is not None:
+        def traced_connect(*args, **kwargs):
+            base = kwargs.get("connection_factory") or extensions.connection
+            kwargs["connection_factory"] = _traced_connection_class(base, extensions.cursor, db_system)
+            return original_connect(*args, **kwargs)
+    elif name == "sqlite3":
+        def traced_connect(*args, **kwargs):
+            base = kwargs.get("factory") or module.Connection
+            kwargs["factory"] = _traced_connection_class(
+                base, module.Cursor, db_system, factory_arg="factory", factory_pos=0
+            )
+            return original_connect(*args, **kwargs)
+    else:
+        def traced_connect(*args, **kwargs):
+            return TracedConnection(original_connect(*args, **kwargs), db_system)
+
+    module.connect = traced_connect
+
+
+def uninstrument_dbapi(module):
+    """Restore the original connect function of a driver module"""
+    with _instrumentation_lock:
+        original_connect = _original_connects.pop(module.__name__, None)
+    if original_connect is not None:
+        module.connect = original_connect
@@ -0,0 +1,31 @@
+import gzip
+import json
+from pathlib import Path
+from typing import Iterator, Dict, Any
+
+
+def iter_records(file_path) -> Iterator[Dict[str, Any]]:
+    """Stream span records from a JSONL (or gzipped .jsonl.gz) trace file"""
+    file_path = Path(file_path)
+    opener = gzip.open if file_path.suffix == '.gz' else open
+    with opener(file_path, 'rt') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Skip malformed lines
+            if isinstance(data, dict):
+                yield data
+
+
+def format_duration(duration_ms: float) -> str:
+    """Format duration with appropriate precision"""
+    if duration_ms < 100:
+        return f"{duration_ms:.2f}ms"
+    elif duration_ms < 1000:
+        return f"{duration_ms:.1f}ms"
+    else:
+        return f"{duration_ms / 1000:.2f}s"
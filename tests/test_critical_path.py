@@ -0,0 +1,83 @@
+import pytest
+
+from latencyx.critical_path import SpanNode, TraceAssembler, critical_path, self_time
+
+
+def record(span_id, start, duration, parent_id=None, name=None, trace_id="t1"):
+    return {
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "span_name": name or span_id,
+        "start_offset_ms": start,
+        "duration_ms": duration,
+    }
+
+
+def build(*records):
+    assembler = TraceAssembler()
+    root = None
+    for r in records:
+        root = assembler.add(r) or root
+    return root
+
+
+def test_sequential_children_are_all_on_critical_path():
+    root = build(
+        record("a", 10, 30, parent_id="root"),
+        record("b", 40, 50, parent_id="root"),
+        record("root", 0, 100),
+    )
+    path = [(node.name, ms) for node, ms in critical_path(root)]
+    assert [name for name, _ in path] == ["root", "a", "b"]
+    assert path[0][1] == pytest.approx(20)
+    assert self_time(root) == pytest.approx(20)
+
+
+def test_parallel_children_only_longest_is_on_critical_path():
+    root = build(
+        record("slow", 10, 80, parent_id="root"),
+        record("fast", 10, 40, parent_id="root"),
+        record("root", 0, 100),
+    )
+    assert [node.name for node, _ in critical_path(root)] == ["root", "slow"]
+    # Overlapping children are only counted once
+    assert self_time(root) == pytest.approx(20)
+
+
+def test_nested_self_time():
+    root = build(
+        record("db", 20, 10, parent_id="handler"),
+        record("handler", 10, 50, parent_id="root"),
+        record("root", 0, 100),
+    )
+    handler = root.children[0]
+    assert self_time(handler) == pytest.approx(40)
+    assert [node.name for node, _ in critical_path(root)] == ["root", "handler", "db"]
+
+
+def test_assembler_attaches_orphans_to_root_and_counts_untraced():
+    assembler = TraceAssembler()
+    assert assembler.add({"span_name": "legacy", "duration_ms": 1.0}) is None
+    assert assembler.add(record("child", 5, 5, parent_id="filtered-out")) is None
+    root = assembler.add(record("root", 0, 20))
+
+    assert [c.name for c in root.children] == ["child"]
+    assert assembler.untraced == 1
+    assert assembler.dropped == 0
+
+
+def test_assembler_drops_oldest_pending_trace_when_full():
+    assembler = TraceAssembler(max_pending=1)
+    assembler.add(record("a", 0, 1, parent_id="ra", trace_id="t1"))
+    assembler.add(record("b", 0, 1, parent_id="rb", trace_id="t2"))
+    assert assembler.dropped == 1
+
+    assembler.close()
+    assert assembler.dropped == 2
+
+
+def test_span_node_defaults_for_missing_fields():
+    node = SpanNode({"span_id": "x"})
+    assert node.name == "unknown"
+    assert node.start == 0.0 and node.duration == 0.0
@@ -0,0 +1,101 @@
+import pytest
+
+from latencyx.instrumentors.dbapi import fingerprint
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM users WHERE id = 42", "SELECT * FROM users WHERE id = ?"),
+    ("SELECT * FROM t WHERE name = 'o''brien'", "SELECT * FROM t WHERE name = ?"),
+    ("SELECT * FROM t WHERE id IN (1, 2,3)", "SELECT * FROM t WHERE id IN (?)"),
+    ("INSERT INTO t VALUES (1, 'a'), (2, 'b');", "INSERT INTO t VALUES (?)"),
+    ("SELECT a::int FROM t WHERE x = $1 AND y = %s AND z = :name", "SELECT a::int FROM t WHERE x = ? AND y = ? AND z = ?"),
+    ("SELECT id\n  FROM t -- trailing comment\n WHERE a = ?", "SELECT id FROM t WHERE a = ?"),
+    ("SELECT /* hint */ id FROM t1", "SELECT id FROM t1"),
+])
+def test_fingerprint(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT '--x', id FROM t WHERE a = 5",
+    "SELECT '/* not a comment', id FROM t WHERE a = 5",
+])
+def test_fingerprint_comment_markers_inside_literals(sql):
+    assert fingerprint(sql) == "SELECT ?, id FROM t WHERE a = ?"
+
+
+@pytest.fixture
+def sqlite():
+    import sqlite3
+    from latencyx.instrumentors.dbapi import instrument_dbapi, uninstrument_dbapi, reset_query_stats
+
+    reset_query_stats()
+    instrument_dbapi(sqlite3, db_system="sqlite")
+    try:
+        yield sqlite3
+    finally:
+        uninstrument_dbapi(sqlite3)
+        reset_query_stats()
+
+
+def test_sqlite_connections_are_real_driver_objects(sqlite):
+    conn = sqlite.connect(":memory:")
+    other = sqlite.connect(":memory:")
+    assert isinstance(conn, sqlite.Connection)
+    assert isinstance(conn.cursor(), sqlite.Cursor)
+
+    conn.execute("CREATE TABLE t (a)")
+    conn.commit()
+    conn.backup(other)
+    other.backup(conn)
+
+
+def test_sqlite_connection_settings_reach_driver(sqlite):
+    conn = sqlite.connect(":memory:")
+    conn.row_factory = sqlite.Row
+    conn.isolation_level = None
+
+    row = conn.execute("SELECT 1 AS one").fetchone()
+    assert row["one"] == 1
+    assert conn.isolation_level is None
+
+
+def test_sqlite_queries_are_recorded(sqlite):
+    from latencyx.instrumentors.dbapi import get_query_stats
+
+    conn = sqlite.connect(":memory:")
+    conn.execute("CREATE TABLE t (a)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(5)])
+    assert [r[0] for r in conn.execute("SELECT a FROM t WHERE a < 3")] == [0, 1, 2]
+
+    stats = get_query_stats()
+    assert stats["INSERT INTO t VALUES (?)"]["rows"] == 5
+    assert stats["SELECT a FROM t WHERE a < ?"]["count"] == 1
+    assert stats["SELECT a FROM t WHERE a < ?"]["rows"] == 3
+
+
+def test_fetch_stats_are_flushed_once_per_result_set(sqlite, monkeypatch):
+    from latencyx.instrumentors import dbapi
+
+    calls = []
+    record = dbapi._record
+    monkeypatch.setattr(dbapi, "_record", lambda query, **kw: (calls.append(kw), record(query, **kw)))
+
+    conn = sqlite.connect(":memory:")
+    conn.execute("CREATE TABLE t (a)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1000)])
+    calls.clear()
+
+    cursor = conn.execute("SELECT a FROM t")
+    assert sum(1 for _ in cursor) == 1000
+    fetches = [kw for kw in calls if "fetch_ms" in kw]
+    assert len(fetches) == 1 and fetches[0]["rows"] == 1000
+
+    # Partially read result sets are flushed on the next execute / close
+    calls.clear()
+    cursor.execute("SELECT a FROM t")
+    cursor.fetchone()
+    cursor.fetchmany(10)
+    cursor.close()
+    fetches = [kw for kw in calls if "fetch_ms" in kw]
+    assert len(fetches) == 1 and fetches[0]["rows"] == 11
@@ -0,0 +1,93 @@
+import json
+import random
+
+import pytest
+
+from latencyx import diff
+from latencyx.diff import QuantileSketch, TraceDiff, TraceProfile, mann_whitney_u
+
+
+def write_trace(path, durations, name="GET /a"):
+    with open(path, "w") as f:
+        for i, duration in enumerate(durations):
+            f.write(json.dumps({
+                "timestamp": f"2026-01-01T00:00:{i // 1000:02d}.{i % 1000:03d}000",
+                "span_name": name,
+                "duration_ms": duration,
+                "status": "success",
+            }) + "\n")
+    return path
+
+
+def lognormal(n, scale=1.0, seed=0):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3, 0.5) * scale for _ in range(n)]
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    values = lognormal(20000)
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_sketch_bucket_cap_keeps_high_quantiles():
+    sketch = QuantileSketch(max_buckets=50)
+    for v in range(1, 10001):
+        sketch.add(float(v))
+    assert len(sketch.buckets) <= 50
+    assert sketch.quantile(0.99) == pytest.approx(9900, rel=0.02)
+
+
+def test_mann_whitney_detects_shift_only():
+    base = lognormal(500, seed=1)
+    assert mann_whitney_u(base, lognormal(500, scale=1.3, seed=2)) < 0.001
+    assert mann_whitney_u(base, lognormal(500, seed=2)) > 0.01
+    # One-sided: a faster candidate is not a regression
+    assert mann_whitney_u(base, lognormal(500, scale=0.7, seed=2)) > 0.99
+
+
+def test_diff_exit_code_on_shifted_distribution(tmp_path, capsys):
+    baseline = write_trace(tmp_path / "base.jsonl", lognormal(2000, seed=1))
+    shifted = write_trace(tmp_path / "slow.jsonl", lognormal(2000, scale=1.3, seed=2))
+    same = write_trace(tmp_path / "same.jsonl", lognormal(2000, seed=2))
+
+    assert TraceDiff(baseline, shifted).run() == 1
+    assert TraceDiff(baseline, same).run() == 0
+    assert TraceDiff(baseline, tmp_path / "missing.jsonl").run() == 2
+
+
+def test_profile_skips_non_finite_durations(tmp_path):
+    path = tmp_path / "nan.jsonl"
+    path.write_text(
+        '{"span_name": "x", "duration_ms": NaN}\n'
+        '{"span_name": "x", "duration_ms": Infinity}\n'
+        '{"span_name": "x", "duration_ms": 5}\n'
+    )
+    profile = TraceProfile(path).load()
+    assert profile.spans["x"].count == 1
+
+
+def test_other_bucket_is_shared_and_never_tested(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(diff, "_MAX_NAMES", 1)
+    baseline = tmp_path / "base.jsonl"
+    candidate = tmp_path / "cand.jsonl"
+    with open(baseline, "w") as b, open(candidate, "w") as c:
+        for d in lognormal(200, seed=1):
+            b.write(json.dumps({"span_name": "a", "duration_ms": d}) + "\n")
+            b.write(json.dumps({"span_name": "b", "duration_ms": d}) + "\n")
+        for d in lognormal(200, scale=3, seed=2):
+            c.write(json.dumps({"span_name": "b", "duration_ms": d}) + "\n")
+            c.write(json.dumps({"span_name": "a", "duration_ms": d / 3}) + "\n")
+
+    differ = TraceDiff(baseline, candidate, output="json")
+    assert differ.run() == 0
+    result = json.loads(capsys.readouterr().out)
+    assert set(result["spans"]) == {"a", "(other)"}
+    assert result["spans"]["(other)"]["tested"] is False
+    assert result["regressions"] == []